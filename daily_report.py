@@ -11,63 +11,141 @@ This script:
 
 import os
 import sys
+import argparse
 import datetime
+import functools
+import shelve
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, List, Any, Tuple, Set
+from typing import Dict, List, Any, Tuple, FrozenSet, Optional
 from dotenv import load_dotenv
 
 # Import our custom modules
+# OneDrive/email modules (msal, requests) are imported where they are used
 from db_connection import get_db_connection, DatabaseConnection
-from onedrive_manager import OneDriveManager
-from email_report import EmailReportGenerator
 
 load_dotenv()
 
 
-def load_skip_apikeys(skip_file: Path = Path("folders_2_skip.txt")) -> Set[str]:
+def _emit(*lines: str):
+    """Write several lines to stdout with a single write call"""
+    sys.stdout.write("\n".join(lines) + "\n")
+
+
+@functools.lru_cache(maxsize=1)
+def load_skip_apikeys(skip_file: Path = Path("folders_2_skip.txt")) -> FrozenSet[str]:
     """
     Load API keys to skip from folders_2_skip.txt
-    Returns set of API keys that should be filtered out (test accounts)
+    Returns frozenset of API keys that should be filtered out (test accounts)
+    The result is cached, so repeated calls don't re-read the file
     """
     if not skip_file.exists():
         print(f"ℹ️  Skip file not found: {skip_file}")
-        return set()
+        return frozenset()
     
-    skip_apikeys = set()
-    with open(skip_file, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if line and not line.startswith('#'):  # Skip empty lines and comments
-                skip_apikeys.add(line)
+    # Skip empty lines and comments
+    text = skip_file.read_text()
+    skip_apikeys = frozenset(
+        line for line in map(str.strip, text.splitlines())
+        if line and line[0] != '#'
+    )
     
     if skip_apikeys:
         print(f"📋 Loaded {len(skip_apikeys)} API keys to skip from {skip_file}")
-        for apikey in skip_apikeys:
-            print(f"   ⏭️  Skipping: {apikey}")
+        if os.getenv('VERBOSE_SKIP'):
+            print("\n".join(f"   ⏭️  Skipping: {apikey}" for apikey in skip_apikeys))
     
     return skip_apikeys
 
 
+class VideoLinkCache:
+    """
+    On-disk cache of resolved video links keyed by (api_key, process_uuid)
+    Misses expire quickly so newly uploaded videos are picked up
+    """
+    
+    HIT_TTL = 7 * 24 * 3600  # 7 days
+    MISS_TTL = 3600  # 1 hour
+    
+    def __init__(self, cache_file: Path):
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        self._db = shelve.open(str(cache_file))
+        self._purge_expired()
+    
+    def _is_expired(self, entry: Tuple[Optional[str], float]) -> bool:
+        video_link, stored_at = entry
+        ttl = self.HIT_TTL if video_link else self.MISS_TTL
+        return time.time() - stored_at > ttl
+    
+    def _purge_expired(self):
+        """Drop expired entries so the cache file doesn't grow without bound"""
+        expired = [key for key, entry in self._db.items() if self._is_expired(entry)]
+        for key in expired:
+            del self._db[key]
+    
+    def get(self, api_key: str, process_uuid: str) -> Tuple[bool, Optional[str]]:
+        """
+        Look up a cached video link
+        Returns (hit, video_link); video_link is None for a cached miss
+        """
+        entry = self._db.get(f"{api_key}:{process_uuid}")
+        if entry is None:
+            return False, None
+        
+        if self._is_expired(entry):
+            return False, None
+        
+        return True, entry[0]
+    
+    def set(self, api_key: str, process_uuid: str, video_link: Optional[str]):
+        """Store a lookup result (None records a miss)"""
+        self._db[f"{api_key}:{process_uuid}"] = (video_link, time.time())
+    
+    def close(self):
+        """Flush and close the cache file"""
+        self._db.close()
+
+
 class DailyReportOrchestrator:
     """Main orchestrator for daily client process reports"""
     
-    def __init__(self):
+    def __init__(self, use_cache: bool = True, send_empty: bool = False):
         self.db = None
         self.onedrive_manager = None
         self.email_generator = None
         
         # Config from .env
         self.notification_email = os.getenv('NOTIFICATION_EMAIL')
-        self.output_dir = Path.home() / "daily_reports" / datetime.datetime.now().strftime('%Y%m%d')
-        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.send_empty = send_empty
+        self._output_dir = None
         
-        # Load API keys to skip (test accounts)
-        self.skip_apikeys = load_skip_apikeys()
+        # API keys to skip (test accounts), loaded in initialize()
+        self.skip_apikeys: FrozenSet[str] = frozenset()
         
+        # OneDrive lookups already done this run (process_uuid -> video link)
+        self.video_links: Dict[str, Optional[str]] = {}
+        
+        # Persist lookups across runs; --no-cache forces a refresh from Graph
+        self.use_cache = use_cache
+        self.video_cache_file = Path.home() / "daily_reports" / ".onedrive_cache"
+        
+    @property
+    def output_dir(self) -> Path:
+        """Today's report directory, created on first access"""
+        if self._output_dir is None:
+            self._output_dir = Path.home() / "daily_reports" / datetime.datetime.now().strftime('%Y%m%d')
+            self._output_dir.mkdir(parents=True, exist_ok=True)
+        return self._output_dir
+    
     def initialize(self):
         """Initialize all components"""
         print("🚀 Initializing Daily Report System\n")
         
+        # Load API keys to skip (test accounts)
+        self.skip_apikeys = load_skip_apikeys()
+        
         # Database connection
         print("1️⃣  Connecting to database...")
         self.db = get_db_connection()
@@ -88,35 +166,32 @@ class DailyReportOrchestrator:
             print("   ℹ️  Failed process logs will not be included")
             self.log_retriever = None
         
-        # OneDrive manager
-        print("3️⃣  Connecting to OneDrive...")
-        self.onedrive_manager = OneDriveManager()
-        
-        # Email generator
-        print("4️⃣  Setting up email generator...")
-        self.email_generator = EmailReportGenerator()
-        
+        # OneDrive and email authenticate against Graph, so they are only
+        # set up once there is something to look up or send
         print("\n✅ All components initialized\n")
     
+    def _get_onedrive_manager(self):
+        """Connect to OneDrive on first use"""
+        if self.onedrive_manager is None:
+            print("🔗 Connecting to OneDrive...")
+            from onedrive_manager import OneDriveManager
+            self.onedrive_manager = OneDriveManager()
+        return self.onedrive_manager
+    
+    def _get_email_generator(self):
+        """Set up the email generator on first use"""
+        if self.email_generator is None:
+            print("📨 Setting up email generator...")
+            from email_report import EmailReportGenerator
+            self.email_generator = EmailReportGenerator()
+        return self.email_generator
+    
     def fetch_processes(self) -> Tuple[List[Dict], Dict[str, List[Dict]]]:
         """Fetch and categorize processes from database"""
-        print("=" * 80)
-        print("📊 FETCHING PROCESS DATA")
-        print("=" * 80 + "\n")
-        
-        # Get all processes from database
-        all_processes = self.db.get_last_24h_processes()
+        _emit("=" * 80, "📊 FETCHING PROCESS DATA", "=" * 80, "")
         
-        # Filter out processes with test API keys
-        if self.skip_apikeys:
-            original_count = len(all_processes)
-            all_processes = [
-                p for p in all_processes 
-                if p.get('api_key') not in self.skip_apikeys
-            ]
-            filtered_count = original_count - len(all_processes)
-            if filtered_count > 0:
-                print(f"🔍 Filtered out {filtered_count} test process(es)")
+        # Get all processes from database, excluding test API keys
+        all_processes = self.db.get_last_24h_processes(skip_apikeys=self.skip_apikeys)
         
         # Categorize remaining processes
         categorized = self.db.categorize_processes(all_processes)
@@ -125,9 +200,7 @@ class DailyReportOrchestrator:
     
     def process_failed_processes(self, failed_processes: List[Dict]) -> Dict[str, Any]:
         """Process all failed processes: retrieve logs if available"""
-        print("\n" + "=" * 80)
-        print("❌ PROCESSING FAILED PROCESSES")
-        print("=" * 80 + "\n")
+        _emit("", "=" * 80, "❌ PROCESSING FAILED PROCESSES", "=" * 80, "")
         
         if not failed_processes:
             print("✅ No failed processes found!")
@@ -151,7 +224,7 @@ class DailyReportOrchestrator:
                 failed_logs[process_uuid] = {
                     'found': False,
                     'log_file': None,
-                    'summary': 'Log retrieval not configured',
+                    'summary': ('Log retrieval not configured', []),
                     'saved_path': None
                 }
                 print(f"   📝 {process['name']} - {process_uuid}")
@@ -160,9 +233,7 @@ class DailyReportOrchestrator:
     
     def process_finished_processes(self, finished_processes: List[Dict]) -> Dict[str, Any]:
         """Process all finished processes: get OneDrive links"""
-        print("\n" + "=" * 80)
-        print("✅ PROCESSING FINISHED PROCESSES")
-        print("=" * 80 + "\n")
+        _emit("", "=" * 80, "✅ PROCESSING FINISHED PROCESSES", "=" * 80, "")
         
         if not finished_processes:
             print("ℹ️  No finished processes found")
@@ -171,37 +242,90 @@ class DailyReportOrchestrator:
         # Get OneDrive links for finished processes
         finished_data = {}
         
+        # Group by API key so each client folder is listed only once
+        by_key: Dict[str, List[Dict]] = defaultdict(list)
+        
         for process in finished_processes:
-            process_uuid = process['process_uuid']
-            client_name = process['name']
-            api_key = process.get('api_key')
-            
-            if not api_key:
-                print(f"\n⚠️  No API key found for client: {client_name}")
-                print(f"   Skipping OneDrive search for {process_uuid}")
-                finished_data[process_uuid] = {
-                    'client_name': client_name,
-                    'api_key': None,
-                    'video_link': None,
-                    'process': process
-                }
+            api_key = process['api_key']
+            if api_key:
+                by_key[api_key].append(process)
                 continue
             
-            print(f"\n🔍 Processing: {client_name} (API key: {api_key}) - {process_uuid}")
-            
-            # Search for video in OneDrive using API key
-            video_link = self.onedrive_manager.find_process_video(
-                process_uuid=process_uuid,
-                api_key=api_key
-            )
-            
+            process_uuid, client_name = process['process_uuid'], process['name']
+            print(f"\n⚠️  No API key found for client: {client_name}")
+            print(f"   Skipping OneDrive search for {process_uuid}")
             finished_data[process_uuid] = {
                 'client_name': client_name,
-                'api_key': api_key,
-                'video_link': video_link,
+                'api_key': None,
+                'video_link': None,
                 'process': process
             }
         
+        video_cache = VideoLinkCache(self.video_cache_file)
+        try:
+            # Search OneDrive only for processes not already looked up
+            pending_by_key = {}
+            cached_count = 0
+            for api_key, processes in by_key.items():
+                pending = set()
+                for process in processes:
+                    process_uuid = process['process_uuid']
+                    if process_uuid in self.video_links:
+                        continue
+                    if self.use_cache:
+                        hit, video_link = video_cache.get(api_key, process_uuid)
+                        if hit:
+                            self.video_links[process_uuid] = video_link
+                            cached_count += 1
+                            continue
+                    pending.add(process_uuid)
+                
+                if pending:
+                    print(f"🔍 Queued: {processes[0]['name']} (API key: {api_key}) - {len(pending)} process(es)")
+                    pending_by_key[api_key] = pending
+            
+            if cached_count:
+                print(f"💾 Reused {cached_count} cached OneDrive lookup(s)")
+            
+            # Client folders are independent, so look them up concurrently
+            if pending_by_key:
+                onedrive_manager = self._get_onedrive_manager()
+                with ThreadPoolExecutor(max_workers=onedrive_manager.concurrency) as executor:
+                    futures = {
+                        executor.submit(onedrive_manager.find_process_videos_bulk, api_key, pending): api_key
+                        for api_key, pending in pending_by_key.items()
+                    }
+                    for future in as_completed(futures):
+                        api_key = futures[future]
+                        try:
+                            found = future.result()
+                        except Exception as e:
+                            # One client's failure shouldn't discard the others' results
+                            print(f"   ⚠️  OneDrive lookup failed for API key {api_key}: {e}")
+                            found = {}
+                        for process_uuid in pending_by_key[api_key]:
+                            if process_uuid not in found:
+                                # Not determined (Graph error): report no link, but
+                                # don't cache it as a miss
+                                self.video_links[process_uuid] = None
+                                continue
+                            video_link = found[process_uuid]
+                            self.video_links[process_uuid] = video_link
+                            video_cache.set(api_key, process_uuid, video_link)
+        finally:
+            video_cache.close()
+        
+        video_links = self.video_links
+        for api_key, processes in by_key.items():
+            for process in processes:
+                process_uuid, client_name = process['process_uuid'], process['name']
+                finished_data[process_uuid] = {
+                    'client_name': client_name,
+                    'api_key': api_key,
+                    'video_link': video_links[process_uuid],
+                    'process': process
+                }
+        
         return finished_data
     
     def generate_and_send_report(
@@ -211,19 +335,19 @@ class DailyReportOrchestrator:
         finished_data: Dict[str, Any]
     ):
         """Generate comprehensive report and send via email"""
-        print("\n" + "=" * 80)
-        print("📧 GENERATING AND SENDING EMAIL REPORT")
-        print("=" * 80 + "\n")
+        _emit("", "=" * 80, "📧 GENERATING AND SENDING EMAIL REPORT", "=" * 80, "")
+        
+        email_generator = self._get_email_generator()
         
         # Generate report
-        report = self.email_generator.generate_report(
+        report = email_generator.generate_report(
             categorized_processes=categorized_processes,
             failed_logs=failed_logs,
             finished_data=finished_data
         )
         
         # Send email
-        self.email_generator.send_report(
+        email_generator.send_report(
             report=report,
             recipient_email=self.notification_email
         )
@@ -234,6 +358,10 @@ class DailyReportOrchestrator:
         """Cleanup resources"""
         if self.db:
             self.db.disconnect()
+        if self.email_generator:
+            self.email_generator.close()
+        if self.onedrive_manager:
+            self.onedrive_manager.close()
     
     def run(self):
         """Main execution flow"""
@@ -244,6 +372,13 @@ class DailyReportOrchestrator:
             # Fetch process data
             all_processes, categorized = self.fetch_processes()
             
+            # Skip OneDrive and email work entirely when there is nothing to report
+            if not (categorized['finished'] or categorized['failed'] or categorized['running']):
+                print("\nℹ️  Nothing to report: no finished, failed or running processes")
+                if self.send_empty:
+                    self.generate_and_send_report(categorized, {}, {})
+                return
+            
             # Process failed processes (without logs)
             failed_logs = self.process_failed_processes(categorized['failed'])
             
@@ -253,9 +388,7 @@ class DailyReportOrchestrator:
             # Generate and send report
             self.generate_and_send_report(categorized, failed_logs, finished_data)
             
-            print("\n" + "=" * 80)
-            print("🎉 DAILY REPORT GENERATION COMPLETE")
-            print("=" * 80 + "\n")
+            _emit("", "=" * 80, "🎉 DAILY REPORT GENERATION COMPLETE", "=" * 80, "")
             
         except Exception as e:
             print(f"\n❌ Error during report generation: {e}")
@@ -269,12 +402,36 @@ class DailyReportOrchestrator:
 
 def main():
     """Entry point"""
-    print("\n" + "=" * 80)
-    print("CLIENT PROCESS DAILY REPORT")
-    print(f"Generated: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print("=" * 80 + "\n")
+    parser = argparse.ArgumentParser(description="Client process daily report")
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help="Ignore cached OneDrive video lookups and query Graph again"
+    )
+    parser.add_argument(
+        '--send-empty',
+        action='store_true',
+        help="Send the email report even when there are no processes to report"
+    )
+    args = parser.parse_args()
+    
+    # Block-buffer stdout when redirected (e.g. cron >> log file)
+    if not sys.stdout.isatty():
+        sys.stdout.reconfigure(line_buffering=False)
+    
+    _emit(
+        "",
+        "=" * 80,
+        "CLIENT PROCESS DAILY REPORT",
+        f"Generated: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+        "=" * 80,
+        ""
+    )
     
-    orchestrator = DailyReportOrchestrator()
+    orchestrator = DailyReportOrchestrator(
+        use_cache=not args.no_cache,
+        send_empty=args.send_empty
+    )
     orchestrator.run()
 
 
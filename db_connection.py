@@ -3,13 +3,74 @@ Database connection and query module for client process monitoring
 """
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Set
 import os
+import sys
+import functools
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
+# Prepared once per connection as procs_24h; $1 is the array of API keys to skip
+# The start_time range scan benefits from:
+#   CREATE INDEX IF NOT EXISTS idx_process_start_time ON process (start_time DESC);
+PROCS_24H_QUERY = """
+    WITH procs AS (
+        SELECT
+            u.name,
+            u.api_key,
+            ps.name AS status_name,
+            p.start_time,
+            p.ping_time,
+            p.stop_time,
+            ROUND(EXTRACT(EPOCH FROM (p.ping_time - p.start_time)) / 60, 1) AS elapsed_time_min,
+            s.uri AS source_uri,
+            s.alias AS source_alias,
+            s.uuid AS source_uuid,
+            p.uuid AS process_uuid,
+            p.user_configuration
+        FROM
+            process p
+            JOIN source s ON p.source_id = s.id
+            JOIN "USER" u ON u.id = s.user_id
+            LEFT JOIN process_status ps ON ps.id = p.status_id
+        WHERE
+            p.start_time > now() - interval '24 hours'
+            AND u.role_id = 2
+            AND (u.api_key IS NULL OR u.api_key <> ALL($1))
+    )
+    SELECT
+        procs.*,
+        CASE
+            WHEN status_name ~* 'finish|complete' THEN 'finished'
+            WHEN status_name ~* 'fail|error' THEN 'failed'
+            WHEN status_name ~* 'running|processing' THEN 'running'
+            ELSE 'other'
+        END AS category
+    FROM
+        procs
+    ORDER BY
+        start_time DESC
+"""
+
+
+def _reconnect_on_drop(method):
+    """Reconnect and retry a query method once if the connection was dropped"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            # Only retry when the connection itself is gone, not on query errors
+            if self.conn is None or not self.conn.closed:
+                raise
+            print(f"⚠️  Database connection lost ({e}), reconnecting...")
+            self.connect()
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 class DatabaseConnection:
     """Handles PostgreSQL database connections and queries"""
     
@@ -19,7 +80,13 @@ class DatabaseConnection:
             'port': os.getenv('DB_PORT', '5432'),
             'database': os.getenv('DB_NAME'),
             'user': os.getenv('DB_USER'),
-            'password': os.getenv('DB_PASSWORD')
+            'password': os.getenv('DB_PASSWORD'),
+            'application_name': 'daily_report',
+            # Keep the connection alive through the long OneDrive phase
+            'keepalives': 1,
+            'keepalives_idle': 30,
+            'keepalives_interval': 10,
+            'keepalives_count': 3
         }
         self.conn = None
         
@@ -27,6 +94,11 @@ class DatabaseConnection:
         """Establish database connection"""
         try:
             self.conn = psycopg2.connect(**self.connection_params)
+            
+            # Parse the 24h query once; repeat calls only EXECUTE it
+            with self.conn.cursor() as cursor:
+                cursor.execute(f"PREPARE procs_24h(text[]) AS {PROCS_24H_QUERY}")
+            
             print("✅ Database connection established")
             return self.conn
         except psycopg2.Error as e:
@@ -39,43 +111,19 @@ class DatabaseConnection:
             self.conn.close()
             print("🔌 Database connection closed")
     
-    def get_last_24h_processes(self) -> List[Dict[str, Any]]:
+    @_reconnect_on_drop
+    def get_last_24h_processes(self, skip_apikeys: Set[str] = frozenset()) -> List[Dict[str, Any]]:
         """
         Retrieve all processes from last 24 hours using the processes_dashboard view
+        Processes belonging to skip_apikeys (test accounts) are excluded in SQL
         Returns list of process dictionaries with all relevant information
         """
-        query = """
-        SELECT
-            u.name,
-            u.api_key,
-            (SELECT name FROM process_status ps WHERE ps.id = p.status_id) AS status_name,
-            p.start_time,
-            p.ping_time,
-            p.stop_time,
-            ROUND(EXTRACT(EPOCH FROM (p.ping_time - p.start_time)) / 60, 1) AS elapsed_time_min,
-            s.uri AS source_uri,
-            s.alias AS source_alias,
-            s.uuid AS source_uuid,
-            p.uuid AS process_uuid,
-            p.user_configuration
-        FROM
-            process p
-            JOIN source s ON p.source_id = s.id
-            JOIN "USER" u ON u.id = s.user_id
-        WHERE
-            p.start_time > now() - interval '24 hours'
-            AND u.role_id = 2
-        ORDER BY
-            p.start_time DESC;
-        """
-        
         try:
             with self.conn.cursor(cursor_factory=RealDictCursor) as cursor:
-                cursor.execute(query)
-                results = cursor.fetchall()
+                cursor.execute("EXECUTE procs_24h(%s)", (list(skip_apikeys),))
                 
-                # Convert to list of dicts
-                processes = [dict(row) for row in results]
+                # RealDictRow is already a dict subclass
+                processes = cursor.fetchall()
                 
                 print(f"📊 Retrieved {len(processes)} processes from last 24h")
                 return processes
@@ -84,6 +132,7 @@ class DatabaseConnection:
             print(f"❌ Query failed: {e}")
             raise
     
+    @_reconnect_on_drop
     def get_user_apikey_mapping(self) -> Dict[str, str]:
         """
         Get mapping of user API keys to client names from database
@@ -111,14 +160,27 @@ class DatabaseConnection:
                 print(f"🗂️  Loaded {len(mapping)} client API key mappings")
                 return mapping
                 
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # Let the reconnect wrapper handle dropped connections
+            raise
         except psycopg2.Error as e:
             print(f"❌ Failed to load API key mapping: {e}")
             # Return empty dict instead of failing
             return {}
     
+    def apikey_mapping_from_processes(self, processes: List[Dict[str, Any]]) -> Dict[str, str]:
+        """
+        Build the API key -> client name mapping from already fetched processes
+        Avoids a second query when only clients active in the last 24h are needed
+        """
+        mapping = {p['api_key']: p['name'] for p in processes if p['api_key']}
+        
+        print(f"🗂️  Derived {len(mapping)} client API key mappings from processes")
+        return mapping
+    
     def categorize_processes(self, processes: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
         """
-        Categorize processes by status: finished, failed, running, etc.
+        Group processes by the category computed in SQL: finished, failed, running, other
         """
         categorized = {
             'finished': [],
@@ -128,22 +190,15 @@ class DatabaseConnection:
         }
         
         for process in processes:
-            status = process['status_name'].lower()
-            
-            if 'finish' in status or 'complete' in status:
-                categorized['finished'].append(process)
-            elif 'fail' in status or 'error' in status:
-                categorized['failed'].append(process)
-            elif 'running' in status or 'processing' in status:
-                categorized['running'].append(process)
-            else:
-                categorized['other'].append(process)
+            categorized[process['category']].append(process)
         
-        print(f"📋 Categorized processes:")
-        print(f"   ✅ Finished: {len(categorized['finished'])}")
-        print(f"   ❌ Failed: {len(categorized['failed'])}")
-        print(f"   ⏳ Running: {len(categorized['running'])}")
-        print(f"   ℹ️  Other: {len(categorized['other'])}")
+        sys.stdout.write(
+            f"📋 Categorized processes:\n"
+            f"   ✅ Finished: {len(categorized['finished'])}\n"
+            f"   ❌ Failed: {len(categorized['failed'])}\n"
+            f"   ⏳ Running: {len(categorized['running'])}\n"
+            f"   ℹ️  Other: {len(categorized['other'])}\n"
+        )
         
         return categorized
 
@@ -183,7 +238,7 @@ if __name__ == "__main__":
         
         categorized = db.categorize_processes(processes)
         
-        mapping = db.get_user_apikey_mapping()
+        mapping = db.apikey_mapping_from_processes(processes)
         print(f"\nAPI Key Mapping: {mapping}")
         
     finally:
@@ -3,16 +3,155 @@ Email Report Generator for Daily Client Process Reports
 """
 
 import os
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from html import escape
+from operator import itemgetter
+from itertools import product
 from typing import Dict, List, Any
 from datetime import datetime
 from pathlib import Path
-from msal import PublicClientApplication, SerializableTokenCache
 from dotenv import load_dotenv
+from graph_client import GRAPH_URL, GRAPH_BATCH_LIMIT, get_msal_app, acquire_token, token_refresh_at, save_token_cache
 
 load_dotenv()
 
 
+# HTML report templates, filled with str.format (literal CSS braces are doubled)
+HTML_HEADER_TEMPLATE = """
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+        .header {{ background: #2c3e50; color: white; padding: 20px; border-radius: 5px; }}
+        .summary {{ background: #ecf0f1; padding: 15px; margin: 20px 0; border-radius: 5px; }}
+        .section {{ margin: 20px 0; }}
+        .section-title {{ color: #2c3e50; border-bottom: 2px solid #3498db; padding-bottom: 5px; }}
+        .process-card {{ background: #fff; border: 1px solid #ddd; padding: 15px; margin: 10px 0; border-radius: 5px; }}
+        .failed {{ border-left: 4px solid #e74c3c; }}
+        .finished {{ border-left: 4px solid #27ae60; }}
+        .running {{ border-left: 4px solid #f39c12; }}
+        .log-snippet {{ background: #2c3e50; color: #ecf0f1; padding: 10px; border-radius: 3px; font-family: monospace; font-size: 12px; overflow-x: auto; }}
+        table {{ width: 100%; border-collapse: collapse; margin: 10px 0; }}
+        th, td {{ padding: 10px; text-align: left; border-bottom: 1px solid #ddd; }}
+        th {{ background: #3498db; color: white; }}
+        .status-badge {{ padding: 3px 8px; border-radius: 3px; font-size: 12px; font-weight: bold; }}
+        .badge-failed {{ background: #e74c3c; color: white; }}
+        .badge-finished {{ background: #27ae60; color: white; }}
+        .badge-running {{ background: #f39c12; color: white; }}
+        a {{ color: #3498db; text-decoration: none; }}
+        a:hover {{ text-decoration: underline; }}
+    </style>
+</head>
+<body>
+    <div class="header">
+        <h1>📊 Daily Client Process Report</h1>
+        <p>Generated: {timestamp}</p>
+    </div>
+    
+    <div class="summary">
+        <h2>📈 Summary</h2>
+        <table>
+            <tr>
+                <th>Total Processes</th>
+                <th>✅ Finished</th>
+                <th>❌ Failed</th>
+                <th>⏳ Running</th>
+            </tr>
+            <tr>
+                <td><strong>{total_processes}</strong></td>
+                <td><span class="status-badge badge-finished">{finished_count}</span></td>
+                <td><span class="status-badge badge-failed">{failed_count}</span></td>
+                <td><span class="status-badge badge-running">{running_count}</span></td>
+            </tr>
+        </table>
+    </div>
+"""
+
+HTML_FOOTER = """
+    <div class="section">
+        <p style="color: #7f8c8d; font-size: 12px;">
+            <em>This is an automated report generated by the Client Process Monitoring System.</em>
+        </p>
+    </div>
+</body>
+</html>
+"""
+
+SECTION_OPEN_TEMPLATE = """
+    <div class="section">
+        <h2 class="section-title">{title}</h2>
+"""
+
+SECTION_CLOSE = """
+    </div>
+"""
+
+FAILED_CARD_TEMPLATE = """
+        <div class="process-card failed">
+            <h3>{name}</h3>
+            <table>
+                <tr><td><strong>Process UUID:</strong></td><td>{uuid}</td></tr>
+                <tr><td><strong>Status:</strong></td><td>{status}</td></tr>
+                <tr><td><strong>Start Time:</strong></td><td>{start_time}</td></tr>
+                <tr><td><strong>Source:</strong></td><td>{source}</td></tr>
+            </table>
+{log_block}
+        </div>
+"""
+
+FAILED_LOG_TEMPLATE = """
+            <h4>🔍 Error Summary:</h4>
+            <div class="log-snippet">{summary}</div>
+            <p><small>Full log available at: {saved_path}</small></p>
+"""
+
+FAILED_NO_LOG_HTML = """
+            <p><em>⚠️ Log file not found</em></p>
+"""
+
+FINISHED_CARD_TEMPLATE = """
+        <div class="process-card finished">
+            <h3>{name}</h3>
+            <table>
+                <tr><td><strong>Process UUID:</strong></td><td>{uuid}</td></tr>
+                <tr><td><strong>Status:</strong></td><td>{status}</td></tr>
+                <tr><td><strong>Start Time:</strong></td><td>{start_time}</td></tr>
+                <tr><td><strong>Stop Time:</strong></td><td>{stop_time}</td></tr>
+                <tr><td><strong>Duration:</strong></td><td>{elapsed} min</td></tr>
+                <tr><td><strong>Source:</strong></td><td>{source}</td></tr>
+{video_row}
+            </table>
+        </div>
+"""
+
+VIDEO_ROW_TEMPLATE = """
+                <tr><td><strong>📹 Video:</strong></td><td><a href="{video_link}">View in OneDrive</a></td></tr>
+"""
+
+VIDEO_MISSING_ROW_HTML = """
+                <tr><td><strong>📹 Video:</strong></td><td><em>Not found in OneDrive</em></td></tr>
+"""
+
+RUNNING_CARD_TEMPLATE = """
+        <div class="process-card running">
+            <h3>{name}</h3>
+            <table>
+                <tr><td><strong>Process UUID:</strong></td><td>{uuid}</td></tr>
+                <tr><td><strong>Status:</strong></td><td>{status}</td></tr>
+                <tr><td><strong>Start Time:</strong></td><td>{start_time}</td></tr>
+                <tr><td><strong>Elapsed:</strong></td><td>{elapsed} min</td></tr>
+            </table>
+        </div>
+"""
+
+# Fields every process card shows, fetched in one call per process
+_CARD_FIELDS = itemgetter('name', 'process_uuid', 'status_name', 'start_time')
+
+
 class EmailReportGenerator:
     """Generates and sends HTML email reports"""
     
@@ -26,50 +165,59 @@ class EmailReportGenerator:
         self.token = None
         self.headers = None
         self.user_email = None
+        self._token_expires_at = 0.0
+        
+        # Persistent connection pool so TLS/TCP setup to Graph is reused
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=20,
+            max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+        ))
+        
+        # One section renderer list per (has_failed, has_finished, has_running)
+        # combination, so report generation doesn't branch per section
+        section_renderers = (self._render_failed_section, self._render_finished_section, self._render_running_section)
+        self._section_renderers = {
+            key: tuple(render for render, present in zip(section_renderers, key) if present)
+            for key in product((False, True), repeat=3)
+        }
         
-        self._authenticate()
+        # Authentication is deferred until the first send_report
+    
+    def close(self):
+        """Close the HTTP session"""
+        self.session.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
     
     def _authenticate(self):
-        """Authenticate with Microsoft Graph API for sending emails"""
-        cache = SerializableTokenCache()
-        if self.cache_file.exists():
-            cache.deserialize(self.cache_file.read_text())
+        """
+        Authenticate with Microsoft Graph API for sending emails
+        Reuses the current token until shortly before it expires
+        """
+        if self.headers and time.monotonic() < self._token_expires_at:
+            return
         
-        app = PublicClientApplication(
-            client_id=self.client_id,
-            authority=self.authority,
-            token_cache=cache
-        )
+        app, cache = get_msal_app(self.client_id, self.authority, self.cache_file)
+        token = acquire_token(app, self.scopes)
+        save_token_cache(cache, self.cache_file)
         
+        # The account is in the cache now, whether it was found there or came from device flow
         accounts = app.get_accounts()
-        token = None
-        
         if accounts:
-            print(f"   Using cached account: {accounts[0]['username']}")
             self.user_email = accounts[0]['username']
-            token = app.acquire_token_silent(self.scopes, account=accounts[0])
-        
-        if not token:
-            print("   No cached token, initiating device flow...")
-            flow = app.initiate_device_flow(scopes=self.scopes)
-            if "user_code" not in flow:
-                raise RuntimeError("Failed to start device flow")
-            print("\n" + "=" * 60)
-            print(flow["message"])
-            print("=" * 60 + "\n")
-            token = app.acquire_token_by_device_flow(flow)
-        
-        if "access_token" not in token:
-            raise RuntimeError(f"Auth failed: {token}")
-        
-        if cache.has_state_changed:
-            self.cache_file.write_text(cache.serialize())
         
         self.token = token
         self.headers = {
             "Authorization": f"Bearer {token['access_token']}",
             "Content-Type": "application/json"
         }
+        self._token_expires_at = token_refresh_at(token)
         
         print("   ✅ Email authentication successful")
     
@@ -119,174 +267,91 @@ class EmailReportGenerator:
         
         # Summary counts
         total_processes = sum(len(procs) for procs in categorized.values())
-        failed_count = len(categorized['failed'])
-        finished_count = len(categorized['finished'])
-        running_count = len(categorized['running'])
-        
-        html = f"""
-<!DOCTYPE html>
-<html>
-<head>
-    <style>
-        body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-        .header {{ background: #2c3e50; color: white; padding: 20px; border-radius: 5px; }}
-        .summary {{ background: #ecf0f1; padding: 15px; margin: 20px 0; border-radius: 5px; }}
-        .section {{ margin: 20px 0; }}
-        .section-title {{ color: #2c3e50; border-bottom: 2px solid #3498db; padding-bottom: 5px; }}
-        .process-card {{ background: #fff; border: 1px solid #ddd; padding: 15px; margin: 10px 0; border-radius: 5px; }}
-        .failed {{ border-left: 4px solid #e74c3c; }}
-        .finished {{ border-left: 4px solid #27ae60; }}
-        .running {{ border-left: 4px solid #f39c12; }}
-        .log-snippet {{ background: #2c3e50; color: #ecf0f1; padding: 10px; border-radius: 3px; font-family: monospace; font-size: 12px; overflow-x: auto; }}
-        table {{ width: 100%; border-collapse: collapse; margin: 10px 0; }}
-        th, td {{ padding: 10px; text-align: left; border-bottom: 1px solid #ddd; }}
-        th {{ background: #3498db; color: white; }}
-        .status-badge {{ padding: 3px 8px; border-radius: 3px; font-size: 12px; font-weight: bold; }}
-        .badge-failed {{ background: #e74c3c; color: white; }}
-        .badge-finished {{ background: #27ae60; color: white; }}
-        .badge-running {{ background: #f39c12; color: white; }}
-        a {{ color: #3498db; text-decoration: none; }}
-        a:hover {{ text-decoration: underline; }}
-    </style>
-</head>
-<body>
-    <div class="header">
-        <h1>📊 Daily Client Process Report</h1>
-        <p>Generated: {timestamp.strftime('%Y-%m-%d %H:%M:%S')}</p>
-    </div>
-    
-    <div class="summary">
-        <h2>📈 Summary</h2>
-        <table>
-            <tr>
-                <th>Total Processes</th>
-                <th>✅ Finished</th>
-                <th>❌ Failed</th>
-                <th>⏳ Running</th>
-            </tr>
-            <tr>
-                <td><strong>{total_processes}</strong></td>
-                <td><span class="status-badge badge-finished">{finished_count}</span></td>
-                <td><span class="status-badge badge-failed">{failed_count}</span></td>
-                <td><span class="status-badge badge-running">{running_count}</span></td>
-            </tr>
-        </table>
-    </div>
-"""
         
-        # Failed Processes Section
-        if categorized['failed']:
-            html += """
-    <div class="section">
-        <h2 class="section-title">❌ Failed Processes</h2>
-"""
-            for process in categorized['failed']:
-                uuid = process['process_uuid']
-                log_info = failed_logs.get(uuid, {})
-                
-                html += f"""
-        <div class="process-card failed">
-            <h3>{process['name']}</h3>
-            <table>
-                <tr><td><strong>Process UUID:</strong></td><td>{uuid}</td></tr>
-                <tr><td><strong>Status:</strong></td><td>{process['status_name']}</td></tr>
-                <tr><td><strong>Start Time:</strong></td><td>{process['start_time']}</td></tr>
-                <tr><td><strong>Source:</strong></td><td>{process.get('source_alias', 'N/A')}</td></tr>
-            </table>
-"""
-                
-                if log_info.get('found'):
-                    summary = log_info.get('summary', '').replace('\n', '<br>')
-                    html += f"""
-            <h4>🔍 Error Summary:</h4>
-            <div class="log-snippet">{summary}</div>
-            <p><small>Full log available at: {log_info.get('saved_path', 'N/A')}</small></p>
-"""
-                else:
-                    html += """
-            <p><em>⚠️ Log file not found</em></p>
-"""
-                
-                html += """
-        </div>
-"""
-            html += """
-    </div>
-"""
-        
-        # Finished Processes Section
-        if categorized['finished']:
-            html += """
-    <div class="section">
-        <h2 class="section-title">✅ Finished Processes</h2>
-"""
-            for process in categorized['finished']:
-                uuid = process['process_uuid']
-                data = finished_data.get(uuid, {})
-                video_link = data.get('video_link')
-                
-                html += f"""
-        <div class="process-card finished">
-            <h3>{process['name']}</h3>
-            <table>
-                <tr><td><strong>Process UUID:</strong></td><td>{uuid}</td></tr>
-                <tr><td><strong>Status:</strong></td><td>{process['status_name']}</td></tr>
-                <tr><td><strong>Start Time:</strong></td><td>{process['start_time']}</td></tr>
-                <tr><td><strong>Stop Time:</strong></td><td>{process.get('stop_time', 'N/A')}</td></tr>
-                <tr><td><strong>Duration:</strong></td><td>{process.get('elapsed_time_min', 'N/A')} min</td></tr>
-                <tr><td><strong>Source:</strong></td><td>{process.get('source_alias', 'N/A')}</td></tr>
-"""
-                
-                if video_link:
-                    html += f"""
-                <tr><td><strong>📹 Video:</strong></td><td><a href="{video_link}">View in OneDrive</a></td></tr>
-"""
-                else:
-                    html += """
-                <tr><td><strong>📹 Video:</strong></td><td><em>Not found in OneDrive</em></td></tr>
-"""
-                
-                html += """
-            </table>
-        </div>
-"""
-            html += """
-    </div>
-"""
+        # Collect fragments and join once at the end
+        parts = [HTML_HEADER_TEMPLATE.format(
+            timestamp=timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+            total_processes=total_processes,
+            finished_count=len(categorized['finished']),
+            failed_count=len(categorized['failed']),
+            running_count=len(categorized['running'])
+        )]
         
-        # Running Processes Section
-        if categorized['running']:
-            html += """
-    <div class="section">
-        <h2 class="section-title">⏳ Running Processes</h2>
-"""
-            for process in categorized['running']:
-                html += f"""
-        <div class="process-card running">
-            <h3>{process['name']}</h3>
-            <table>
-                <tr><td><strong>Process UUID:</strong></td><td>{process['process_uuid']}</td></tr>
-                <tr><td><strong>Status:</strong></td><td>{process['status_name']}</td></tr>
-                <tr><td><strong>Start Time:</strong></td><td>{process['start_time']}</td></tr>
-                <tr><td><strong>Elapsed:</strong></td><td>{process.get('elapsed_time_min', 'N/A')} min</td></tr>
-            </table>
-        </div>
-"""
-            html += """
-    </div>
-"""
+        # The renderer list for this (failed, finished, running) combination
+        # only contains the sections that have processes
+        key = (bool(categorized['failed']), bool(categorized['finished']), bool(categorized['running']))
+        for render_section in self._section_renderers[key]:
+            render_section(parts, categorized, failed_logs, finished_data)
         
-        html += """
-    <div class="section">
-        <p style="color: #7f8c8d; font-size: 12px;">
-            <em>This is an automated report generated by the Client Process Monitoring System.</em>
-        </p>
-    </div>
-</body>
-</html>
-"""
+        parts.append(HTML_FOOTER)
         
-        return html
+        return "".join(parts)
+    
+    def _render_failed_section(self, parts, categorized, failed_logs, finished_data):
+        """Append the failed processes section"""
+        parts.append(SECTION_OPEN_TEMPLATE.format(title="❌ Failed Processes"))
+        for process in categorized['failed']:
+            name, uuid, status, start_time = _CARD_FIELDS(process)
+            log_info = failed_logs.get(uuid, {})
+            
+            if log_info.get('found'):
+                header, summary_lines = log_info['summary']
+                summary = escape(header) + '<br><br>' + '<br>'.join(map(escape, summary_lines))
+                log_block = FAILED_LOG_TEMPLATE.format(
+                    summary=summary,
+                    saved_path=escape(str(log_info.get('saved_path', 'N/A')))
+                )
+            else:
+                log_block = FAILED_NO_LOG_HTML
+            
+            parts.append(FAILED_CARD_TEMPLATE.format(
+                name=escape(str(name)),
+                uuid=escape(str(uuid)),
+                status=escape(str(status)),
+                start_time=start_time,
+                source=escape(str(process.get('source_alias', 'N/A'))),
+                log_block=log_block
+            ))
+        parts.append(SECTION_CLOSE)
+    
+    def _render_finished_section(self, parts, categorized, failed_logs, finished_data):
+        """Append the finished processes section"""
+        parts.append(SECTION_OPEN_TEMPLATE.format(title="✅ Finished Processes"))
+        for process in categorized['finished']:
+            name, uuid, status, start_time = _CARD_FIELDS(process)
+            data = finished_data.get(uuid, {})
+            video_link = data.get('video_link')
+            
+            if video_link:
+                video_row = VIDEO_ROW_TEMPLATE.format(video_link=escape(video_link))
+            else:
+                video_row = VIDEO_MISSING_ROW_HTML
+            
+            parts.append(FINISHED_CARD_TEMPLATE.format(
+                name=escape(str(name)),
+                uuid=escape(str(uuid)),
+                status=escape(str(status)),
+                start_time=start_time,
+                stop_time=process.get('stop_time', 'N/A'),
+                elapsed=process.get('elapsed_time_min', 'N/A'),
+                source=escape(str(process.get('source_alias', 'N/A'))),
+                video_row=video_row
+            ))
+        parts.append(SECTION_CLOSE)
+    
+    def _render_running_section(self, parts, categorized, failed_logs, finished_data):
+        """Append the running processes section"""
+        parts.append(SECTION_OPEN_TEMPLATE.format(title="⏳ Running Processes"))
+        for process in categorized['running']:
+            name, uuid, status, start_time = _CARD_FIELDS(process)
+            parts.append(RUNNING_CARD_TEMPLATE.format(
+                name=escape(str(name)),
+                uuid=escape(str(uuid)),
+                status=escape(str(status)),
+                start_time=start_time,
+                elapsed=process.get('elapsed_time_min', 'N/A')
+            ))
+        parts.append(SECTION_CLOSE)
     
     def _generate_text_report(
         self,
@@ -297,91 +362,130 @@ class EmailReportGenerator:
     ) -> str:
         """Generate plain text version of report"""
         
-        lines = []
-        lines.append("=" * 80)
-        lines.append("DAILY CLIENT PROCESS REPORT")
-        lines.append(f"Generated: {timestamp.strftime('%Y-%m-%d %H:%M:%S')}")
-        lines.append("=" * 80)
-        lines.append("")
-        
-        # Summary
-        total = sum(len(procs) for procs in categorized.values())
-        lines.append(f"Total Processes: {total}")
-        lines.append(f"  ✅ Finished: {len(categorized['finished'])}")
-        lines.append(f"  ❌ Failed: {len(categorized['failed'])}")
-        lines.append(f"  ⏳ Running: {len(categorized['running'])}")
-        lines.append("")
-        
-        # Failed processes
-        if categorized['failed']:
-            lines.append("-" * 80)
-            lines.append("FAILED PROCESSES")
-            lines.append("-" * 80)
-            for process in categorized['failed']:
-                lines.append(f"\nClient: {process['name']}")
-                lines.append(f"UUID: {process['process_uuid']}")
-                lines.append(f"Status: {process['status_name']}")
-                lines.append(f"Start: {process['start_time']}")
-                
-                log_info = failed_logs.get(process['process_uuid'], {})
-                if log_info.get('found'):
-                    lines.append(f"Log: {log_info.get('saved_path', 'N/A')}")
-            lines.append("")
-        
-        # Finished processes
-        if categorized['finished']:
-            lines.append("-" * 80)
-            lines.append("FINISHED PROCESSES")
-            lines.append("-" * 80)
-            for process in categorized['finished']:
-                data = finished_data.get(process['process_uuid'], {})
-                lines.append(f"\nClient: {process['name']}")
-                lines.append(f"UUID: {process['process_uuid']}")
-                lines.append(f"Duration: {process.get('elapsed_time_min', 'N/A')} min")
-                
-                if data.get('video_link'):
-                    lines.append(f"Video: {data['video_link']}")
-            lines.append("")
-        
-        return "\n".join(lines)
+        def _lines():
+            yield "=" * 80
+            yield "DAILY CLIENT PROCESS REPORT"
+            yield f"Generated: {timestamp.strftime('%Y-%m-%d %H:%M:%S')}"
+            yield "=" * 80
+            yield ""
+            
+            # Summary
+            total = sum(len(procs) for procs in categorized.values())
+            yield f"Total Processes: {total}"
+            yield f"  ✅ Finished: {len(categorized['finished'])}"
+            yield f"  ❌ Failed: {len(categorized['failed'])}"
+            yield f"  ⏳ Running: {len(categorized['running'])}"
+            yield ""
+            
+            # Failed processes
+            if categorized['failed']:
+                yield "-" * 80
+                yield "FAILED PROCESSES"
+                yield "-" * 80
+                for process in categorized['failed']:
+                    yield f"\nClient: {process['name']}"
+                    yield f"UUID: {process['process_uuid']}"
+                    yield f"Status: {process['status_name']}"
+                    yield f"Start: {process['start_time']}"
+                    
+                    log_info = failed_logs.get(process['process_uuid'], {})
+                    if log_info.get('found'):
+                        yield f"Log: {log_info.get('saved_path', 'N/A')}"
+                yield ""
+            
+            # Finished processes
+            if categorized['finished']:
+                yield "-" * 80
+                yield "FINISHED PROCESSES"
+                yield "-" * 80
+                for process in categorized['finished']:
+                    data = finished_data.get(process['process_uuid'], {})
+                    yield f"\nClient: {process['name']}"
+                    yield f"UUID: {process['process_uuid']}"
+                    yield f"Duration: {process.get('elapsed_time_min', 'N/A')} min"
+                    
+                    if data.get('video_link'):
+                        yield f"Video: {data['video_link']}"
+                yield ""
+        
+        return "\n".join(_lines())
     
     def send_report(self, report: Dict[str, str], recipient_email: str = None):
         """Send email report via Microsoft Graph API"""
+        self._authenticate()
         
         if recipient_email is None:
             recipient_email = self.user_email
         
-        print(f"   Sending report to: {recipient_email}")
+        self.send_reports(report, [recipient_email])
+    
+    def send_reports(self, report: Dict[str, str], recipients: List[str]):
+        """
+        Send the email report to several recipients, one message each
+        Messages go out through Graph's $batch endpoint, 20 per request
+        Raises ValueError if there is no recipient address to send to
+        """
+        self._authenticate()
+        
+        if not recipients or not all(recipients):
+            raise ValueError("No recipient email address: set NOTIFICATION_EMAIL or sign in with a mail account")
         
-        url = "https://graph.microsoft.com/v1.0/me/sendMail"
+        url = f"{GRAPH_URL}/$batch"
         
-        payload = {
-            "message": {
-                "subject": report['subject'],
-                "body": {
-                    "contentType": "HTML",
-                    "content": report['html_body']
-                },
-                "toRecipients": [
+        for start in range(0, len(recipients), GRAPH_BATCH_LIMIT):
+            chunk = recipients[start:start + GRAPH_BATCH_LIMIT]
+            print(f"   Sending report to: {', '.join(chunk)}")
+            
+            payload = {
+                "requests": [
                     {
-                        "emailAddress": {
-                            "address": recipient_email
+                        "id": str(i),
+                        "method": "POST",
+                        "url": "/me/sendMail",
+                        "headers": {"Content-Type": "application/json"},
+                        "body": {
+                            "message": {
+                                "subject": report['subject'],
+                                "body": {
+                                    "contentType": "HTML",
+                                    "content": report['html_body']
+                                },
+                                "toRecipients": [
+                                    {
+                                        "emailAddress": {
+                                            "address": recipient
+                                        }
+                                    }
+                                ]
+                            },
+                            "saveToSentItems": True
                         }
                     }
+                    for i, recipient in enumerate(chunk)
                 ]
-            },
-            "saveToSentItems": True
-        }
-        
-        try:
-            response = requests.post(url, headers=self.headers, json=payload)
-            response.raise_for_status()
+            }
+            
+            try:
+                response = self.session.post(url, headers=self.headers, json=payload, timeout=30)
+                response.raise_for_status()
+            
+            except requests.exceptions.HTTPError as e:
+                print(f"   ❌ Failed to send email: {e}")
+                print(f"   Response: {response.text}")
+                raise
+            
+            # The batch itself succeeds even when individual sends fail
+            failed = [
+                (chunk[int(result['id'])], result)
+                for result in response.json().get('responses', [])
+                if result.get('status', 500) >= 400
+            ]
+            if failed:
+                for recipient, result in failed:
+                    print(f"   ❌ Failed to send email to {recipient}: {result.get('status')} {result.get('body')}")
+                raise RuntimeError(f"Failed to send email to {len(failed)} recipient(s)")
+            
             print("   ✅ Email sent successfully!")
-        
-        except requests.exceptions.HTTPError as e:
-            print(f"   ❌ Failed to send email: {e}")
-            print(f"   Response: {response.text}")
-            raise
 
 
 if __name__ == "__main__":
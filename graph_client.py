@@ -0,0 +1,79 @@
+"""
+Microsoft Graph helpers shared by the OneDrive and email modules
+"""
+
+import functools
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Tuple
+from msal import PublicClientApplication, SerializableTokenCache
+
+
+GRAPH_URL = "https://graph.microsoft.com/v1.0"
+
+# Graph accepts at most 20 requests per $batch call
+GRAPH_BATCH_LIMIT = 20
+
+# Serializes token cache file writes; reads of the in-memory cache are lock-free
+_cache_write_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def get_msal_app(client_id: str, authority: str, cache_file: Path) -> Tuple[PublicClientApplication, SerializableTokenCache]:
+    """
+    Build the MSAL app and load its token cache from disk
+    Cached per cache file, so each file is parsed once per process
+    """
+    cache = SerializableTokenCache()
+    if cache_file.exists():
+        cache.deserialize(cache_file.read_text())
+    
+    app = PublicClientApplication(
+        client_id=client_id,
+        authority=authority,
+        token_cache=cache
+    )
+    return app, cache
+
+
+def acquire_token(app: PublicClientApplication, scopes: List[str]) -> Dict[str, Any]:
+    """Get a token from an MSAL app, silently if possible, else through device flow"""
+    accounts = app.get_accounts()
+    token = None
+    
+    if accounts:
+        print(f"   Using cached account: {accounts[0]['username']}")
+        token = app.acquire_token_silent(scopes, account=accounts[0])
+    
+    if not token:
+        print("   No cached token, initiating device flow...")
+        flow = app.initiate_device_flow(scopes=scopes)
+        if "user_code" not in flow:
+            raise RuntimeError("Failed to start device flow")
+        print("\n" + "=" * 60)
+        print(flow["message"])
+        print("=" * 60 + "\n")
+        token = app.acquire_token_by_device_flow(flow)
+    
+    if "access_token" not in token:
+        raise RuntimeError(f"Auth failed: {token}")
+    
+    return token
+
+
+def token_refresh_at(token: Dict[str, Any]) -> float:
+    """
+    Monotonic time after which a token should be replaced
+    A minute before it expires, so requests never go out with a stale token
+    """
+    return time.monotonic() + int(token.get('expires_in', 0)) - 60
+
+
+def save_token_cache(cache: SerializableTokenCache, cache_file: Path) -> bool:
+    """Write an MSAL token cache to disk if it changed; returns whether it was written"""
+    with _cache_write_lock:
+        if not cache.has_state_changed:
+            return False
+        cache_file.write_text(cache.serialize())
+        return True
@@ -1,13 +1,82 @@
 """
 Log retrieval and processing module for failed processes
 """
+import io
 import os
 import re
 from pathlib import Path
-from typing import List, Dict, Any, Optional
-import gzip
+from typing import List, Dict, Any, Optional, Set, Tuple, BinaryIO, Iterable, Iterator
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+try:
+    # ISA-L's SIMD DEFLATE/CRC32 is a drop-in replacement for gzip
+    from isal import igzip as gzip
+except ImportError:
+    import gzip
+
+
+# Patterns to identify important log lines (ERROR, EXCEPTION, TRACEBACK, ...)
+_IMPORTANT_RE = re.compile(
+    r'(?:ERROR|EXCEPTION|TRACEBACK|CRITICAL|FATAL|Failed|Exception:)',
+    re.IGNORECASE
+)
+
+
+class _ErrorSummary:
+    """
+    Running error summary of a stream of log lines
+    Keeps only the last max_lines important lines and the last max_lines lines overall
+    """
+    
+    def __init__(self, max_lines: int = 50):
+        self.important_lines = deque(maxlen=max_lines)
+        self.tail_lines = deque(maxlen=max_lines)
+        self.important_count = 0
+        self.line_count = 0
+    
+    def add(self, line: str):
+        self.tail_lines.append(line)
+        self.line_count += 1
+        if _IMPORTANT_RE.search(line):
+            self.important_lines.append(line)
+            self.important_count += 1
+    
+    def result(self) -> Tuple[str, List[str]]:
+        """Return (header, summary lines)"""
+        if not self.tail_lines:
+            return "No log data available", []
+        
+        # If we have important lines, use those; otherwise use last N lines
+        if self.important_lines:
+            result_lines = self.important_lines
+            header = f"=== Error Summary ({self.important_count} error lines found) ==="
+        else:
+            result_lines = self.tail_lines
+            header = f"=== Last {len(result_lines)} log lines ==="
+        
+        return header, list(result_lines)
+
+
+def _read_magic(log_file: Path) -> bytes:
+    """Read the leading bytes, so compressed logs are detected whatever their name"""
+    with open(log_file, 'rb') as f:
+        return f.read(4)
+
+
+def _open_log(log_file: Path) -> BinaryIO:
+    """Open a plain, gzip or zstandard log file for binary line reading"""
+    magic = _read_magic(log_file)
+    if magic[:2] == b'\x1f\x8b':
+        return gzip.open(log_file, 'rb')
+    if magic == b'\x28\xb5\x2f\xfd':
+        # Only needed if logs are compressed with zstd
+        import zstandard
+        reader = zstandard.ZstdDecompressor().stream_reader(open(log_file, 'rb'), closefd=True)
+        return io.BufferedReader(reader, buffer_size=1 << 20)
+    return open(log_file, 'rb')
+
 
 class LogRetriever:
     """Handles retrieval and filtering of process logs"""
@@ -16,6 +85,10 @@ class LogRetriever:
         self.logs_dir = Path(logs_dir)
         if not self.logs_dir.exists():
             raise FileNotFoundError(f"Logs directory not found: {logs_dir}")
+        
+        # date_str -> sorted [(log file, parsed timestamp or None)], built once
+        # so lookups don't rescan the directory
+        self._by_date = self._index_log_files()
     
     def find_log_file(self, process_uuid: str, start_time: datetime) -> Optional[Path]:
         """
@@ -26,65 +99,88 @@ class LogRetriever:
         1. Find log files from the same date as start_time
         2. Check if they contain the process_uuid
         """
+        candidates = self._candidate_log_files(start_time)
+        if not candidates:
+            return None
+        
+        # Search each file for the process UUID
+        for log_file in candidates:
+            # Reading stops at the first matching line
+            if next(self._iter_process_lines(log_file, {process_uuid}), None):
+                print(f"   ✅ Found log file: {log_file.name}")
+                return log_file
+        
+        print(f"   ⚠️  Process UUID {process_uuid} not found in any log files")
+        return None
+    
+    def _candidate_log_files(self, start_time: datetime) -> List[Path]:
+        """
+        List log files that may contain a process started at start_time
+        Returns files from the same date, in name order, whose timestamp is
+        within -1h/+24h of start_time (unparseable names are kept)
+        """
         # Format the date for log file matching
         # Logs use: 2026-02-06T03-08-14_perception_api.log
         date_str = start_time.strftime('%Y-%m-%d')
         
         print(f"   Searching for logs from {date_str}...")
         
-        # Find all log files from that date
-        pattern = f"{date_str}T*_perception_api.log"
-        matching_files = list(self.logs_dir.glob(pattern))
-        
-        if not matching_files:
-            print(f"   ⚠️  No log files found matching pattern: {pattern}")
-            return None
+        log_files = self._by_date.get(date_str, [])
+        if not log_files:
+            print(f"   ⚠️  No log files found matching pattern: {date_str}T*_perception_api.log")
+            return []
         
-        print(f"   Found {len(matching_files)} log file(s) from {date_str}")
+        print(f"   Found {len(log_files)} log file(s) from {date_str}")
         
-        # Search each file for the process UUID
-        for log_file in sorted(matching_files):
-            # Parse log file timestamp to check if it's around the start_time
-            try:
-                # Extract timestamp from filename: 2026-02-06T03-08-14
-                filename = log_file.stem  # Remove .log extension
-                timestamp_str = filename.split('_')[0]  # Get the datetime part
-                log_time = datetime.strptime(timestamp_str, '%Y-%m-%dT%H-%M-%S')
-                
-                # Only check files that started before or around the process start time
-                # (with 1 hour buffer)
+        candidates = []
+        for log_file, log_time in log_files:
+            # Only check files that started before or around the process start time
+            # (with 1 hour buffer); still check files whose timestamp couldn't be parsed
+            if log_time is not None:
                 time_diff = (start_time - log_time).total_seconds()
                 if time_diff < -3600 or time_diff > 86400:  # -1h to +24h window
                     continue
-                
-            except Exception as e:
-                print(f"   Warning: Could not parse timestamp from {log_file.name}: {e}")
-                # Still check the file if we can't parse the timestamp
             
-            # Check if this log file contains the process UUID
-            if self._contains_uuid(log_file, process_uuid):
-                print(f"   ✅ Found log file: {log_file.name}")
-                return log_file
+            candidates.append(log_file)
         
-        print(f"   ⚠️  Process UUID {process_uuid} not found in any log files")
-        return None
+        return candidates
     
-    def _contains_uuid(self, log_file: Path, process_uuid: str) -> bool:
-        """Check if log file contains the process UUID"""
-        try:
-            if log_file.suffix == '.gz':
-                with gzip.open(log_file, 'rt') as f:
-                    for line in f:
-                        if process_uuid in line:
-                            return True
-            else:
-                with open(log_file, 'r') as f:
-                    for line in f:
-                        if process_uuid in line:
-                            return True
-        except Exception as e:
-            print(f"Warning: Could not read {log_file}: {e}")
-        return False
+    def _index_log_files(self) -> Dict[str, List[Tuple[Path, Optional[datetime]]]]:
+        """
+        Index the logs directory by date with one scandir pass
+        Returns dict mapping date_str to its log files, in name order, with
+        their parsed filename timestamps
+        """
+        by_date = defaultdict(list)
+        with os.scandir(self.logs_dir) as entries:
+            for entry in entries:
+                # Logs use: 2026-02-06T03-08-14_perception_api.log
+                name = entry.name
+                if name[10:11] != 'T' or not name.endswith('_perception_api.log') or not entry.is_file():
+                    continue
+                by_date[name[:10]].append(Path(entry.path))
+        
+        index = {}
+        for date_str, log_files in by_date.items():
+            index[date_str] = []
+            for log_file in sorted(log_files):
+                name = log_file.name
+                try:
+                    # Timestamp from the fixed-width prefix 2026-02-06T03-08-14_,
+                    # sliced directly (much cheaper than strptime)
+                    if name[19:20] != '_' or name[13] != '-' or name[16] != '-':
+                        raise ValueError(f"unexpected timestamp format: {name.split('_')[0]}")
+                    log_time = datetime(
+                        int(name[0:4]), int(name[5:7]), int(name[8:10]),
+                        int(name[11:13]), int(name[14:16]), int(name[17:19])
+                    )
+                except Exception as e:
+                    print(f"   Warning: Could not parse timestamp from {log_file.name}: {e}")
+                    log_time = None
+                
+                index[date_str].append((log_file, log_time))
+        
+        return index
     
     def extract_process_logs(self, log_file: Path, process_uuid: str) -> List[str]:
         """
@@ -93,56 +189,72 @@ class LogRetriever:
         if not log_file or not log_file.exists():
             return []
         
-        process_lines = []
+        process_lines = [
+            line.decode('utf-8', 'replace')
+            for _, line in self._iter_process_lines(log_file, {process_uuid})
+        ]
+        
+        print(f"📝 Extracted {len(process_lines)} log lines for {process_uuid}")
+        return process_lines
+    
+    def _iter_process_lines(self, log_file: Path, process_uuids: Set[str]) -> Iterator[Tuple[str, bytes]]:
+        """
+        Read a log file once and yield (process_uuid, raw line) for every line
+        of the given process UUIDs
+        """
+        # One alternation matches all UUIDs in a single pass per line; lines are
+        # matched as raw bytes and left to the caller to decode
+        uuid_pattern = re.compile(b"|".join(re.escape(uuid.encode()) for uuid in process_uuids))
         
         try:
-            if log_file.suffix == '.gz':
-                with gzip.open(log_file, 'rt') as f:
-                    process_lines = [line for line in f if process_uuid in line]
-            else:
-                with open(log_file, 'r') as f:
-                    process_lines = [line for line in f if process_uuid in line]
-            
-            print(f"📝 Extracted {len(process_lines)} log lines for {process_uuid}")
-            return process_lines
-            
+            with _open_log(log_file) as f:
+                for line in f:
+                    matches = uuid_pattern.findall(line)
+                    if not matches:
+                        continue
+                    for match in set(matches):
+                        yield match.decode(), line
+        
         except Exception as e:
             print(f"❌ Error reading log file {log_file}: {e}")
-            return []
     
-    def extract_error_summary(self, log_lines: List[str], max_lines: int = 50) -> str:
+    def extract_error_summary(self, log_lines: Iterable[str], max_lines: int = 50) -> Tuple[str, List[str]]:
         """
         Extract error summary from log lines
         Focuses on ERROR, EXCEPTION, TRACEBACK, etc.
+        Returns (header, summary lines) so callers can format the lines themselves
+        Lines are consumed in one pass and only the last max_lines of each kind
+        are kept, so log_lines can be a generator over a large file
         """
-        if not log_lines:
-            return "No log data available"
-        
-        # Patterns to identify important log lines
-        important_patterns = [
-            r'ERROR',
-            r'EXCEPTION',
-            r'TRACEBACK',
-            r'CRITICAL',
-            r'FATAL',
-            r'Failed',
-            r'Exception:',
-        ]
-        
-        important_lines = []
+        summary = _ErrorSummary(max_lines)
         for line in log_lines:
-            if any(re.search(pattern, line, re.IGNORECASE) for pattern in important_patterns):
-                important_lines.append(line)
+            summary.add(line)
+        return summary.result()
+    
+    def _stream_log_file(self, log_file: Path, process_uuids: Set[str], part_prefix: Path) -> Dict[str, Tuple[Path, _ErrorSummary]]:
+        """
+        Read a log file once, writing the lines of every given process UUID to
+        its own part file ({part_prefix}.{uuid}.part) while summarizing them
+        Returns dict mapping process_uuid to (part file, summary) (UUIDs not found are absent)
+        """
+        found: Dict[str, Tuple[Path, _ErrorSummary]] = {}
+        writers: Dict[str, BinaryIO] = {}
         
-        # If we have important lines, use those; otherwise use last N lines
-        if important_lines:
-            result_lines = important_lines[-max_lines:]
-            header = f"=== Error Summary ({len(important_lines)} error lines found) ===\n\n"
-        else:
-            result_lines = log_lines[-max_lines:]
-            header = f"=== Last {len(result_lines)} log lines ===\n\n"
+        try:
+            for process_uuid, line in self._iter_process_lines(log_file, process_uuids):
+                if process_uuid not in found:
+                    part_file = part_prefix.with_name(f"{part_prefix.name}.{process_uuid}.part")
+                    writers[process_uuid] = open(part_file, 'wb')
+                    found[process_uuid] = (part_file, _ErrorSummary())
+                # Lines go to disk as read; only the summary stays in memory
+                writers[process_uuid].write(line)
+                found[process_uuid][1].add(line.decode('utf-8', 'replace'))
         
-        return header + "".join(result_lines)
+        finally:
+            for writer in writers.values():
+                writer.close()
+        
+        return found
     
     def save_process_log(self, process_uuid: str, log_content: str, output_dir: Path) -> Path:
         """
@@ -154,8 +266,8 @@ class LogRetriever:
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         output_file = output_dir / f"{process_uuid}_{timestamp}.log"
         
-        with open(output_file, 'w') as f:
-            f.write(log_content)
+        # Encode explicitly and write in one call, bypassing the text layer
+        output_file.write_bytes(log_content.encode('utf-8'))
         
         print(f"💾 Saved process log to: {output_file}")
         return output_file
@@ -163,54 +275,83 @@ class LogRetriever:
     def get_failed_process_logs(
         self, 
         failed_processes: List[Dict[str, Any]], 
-        output_dir: Optional[Path] = None
+        output_dir: Optional[Path] = None,
+        include_full_log: bool = False
     ) -> Dict[str, Dict[str, Any]]:
         """
         Get logs for all failed processes
         Returns dict mapping process_uuid to log info
+        The full log is always saved to output_dir; it is only kept in the
+        result ('full_log') when include_full_log is set
         """
         if output_dir is None:
             output_dir = Path.home() / "failed_process_logs"
         
+        # Candidate log files per process, then the UUIDs to look for in each file
+        uuids_by_file: Dict[Path, Set[str]] = defaultdict(set)
+        for process in failed_processes:
+            print(f"\n🔍 Searching logs for process: {process['process_uuid']}")
+            for log_file in self._candidate_log_files(process['start_time']):
+                uuids_by_file[log_file].add(process['process_uuid'])
+        
+        output_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Scan each file once for all of its UUIDs, streaming matching lines
+        # to disk; files are independent disk reads, so scan them concurrently
+        log_files = sorted(uuids_by_file)
+        scanned = {}
+        if log_files:
+            with ThreadPoolExecutor(max_workers=min(8, len(log_files))) as executor:
+                scanned = dict(zip(log_files, executor.map(
+                    lambda indexed: self._stream_log_file(
+                        indexed[1], uuids_by_file[indexed[1]], output_dir / f".scan{indexed[0]}"
+                    ),
+                    enumerate(log_files)
+                )))
+        
+        # Like find_log_file, the first file (in name order) containing a UUID is
+        # the one used; the other files' part files are discarded
+        found_logs: Dict[str, Tuple[Path, Path, _ErrorSummary]] = {}
+        for log_file in log_files:
+            for process_uuid, (part_file, summary) in scanned[log_file].items():
+                if process_uuid in found_logs:
+                    part_file.unlink()
+                    continue
+                print(f"   ✅ Found log file for {process_uuid}: {log_file.name}")
+                print(f"📝 Extracted {summary.line_count} log lines for {process_uuid}")
+                found_logs[process_uuid] = (log_file, part_file, summary)
+        
         results = {}
         
         for process in failed_processes:
             process_uuid = process['process_uuid']
-            start_time = process['start_time']
-            
-            print(f"\n🔍 Searching logs for process: {process_uuid}")
             
-            # Find log file
-            log_file = self.find_log_file(process_uuid, start_time)
-            
-            if not log_file:
+            if process_uuid not in found_logs:
                 print(f"⚠️  No log file found for {process_uuid}")
                 results[process_uuid] = {
                     'found': False,
                     'log_file': None,
-                    'summary': 'Log file not found',
+                    'summary': ('Log file not found', []),
                     'saved_path': None
                 }
                 continue
             
-            # Extract process logs
-            log_lines = self.extract_process_logs(log_file, process_uuid)
-            
-            # Create summary
-            summary = self.extract_error_summary(log_lines)
-            full_log = "".join(log_lines)
+            log_file, part_file, summary = found_logs[process_uuid]
             
-            # Save to file
-            saved_path = self.save_process_log(process_uuid, full_log, output_dir)
+            # The process's lines are already on disk; give the part file its final name
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            saved_path = part_file.replace(output_dir / f"{process_uuid}_{timestamp}.log")
+            print(f"💾 Saved process log to: {saved_path}")
             
             results[process_uuid] = {
                 'found': True,
                 'log_file': str(log_file),
-                'summary': summary,
-                'full_log': full_log,
+                'summary': summary.result(),
                 'saved_path': str(saved_path),
-                'line_count': len(log_lines)
+                'line_count': summary.line_count
             }
+            if include_full_log:
+                results[process_uuid]['full_log'] = saved_path.read_text(encoding='utf-8', errors='replace')
         
         return results
 
@@ -3,18 +3,82 @@ OneDrive Manager for finding process videos and generating sharing links
 """
 
 import os
+import sys
+import json
+import datetime
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pathlib import Path
-from typing import Optional, Dict, Any, List
-from msal import PublicClientApplication, SerializableTokenCache
+from urllib.parse import quote
+from typing import Optional, Dict, Any, List, Set, Tuple
 from dotenv import load_dotenv
+from graph_client import GRAPH_URL, GRAPH_BATCH_LIMIT, get_msal_app, acquire_token, token_refresh_at, save_token_cache
+
+try:
+    # orjson parses large Graph listings several times faster than json
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
 
 load_dotenv()
 
 
+# Only the driveItem fields this module reads, in pages of 200
+CHILDREN_QUERY = "?$select=id,name,file,folder,webUrl,createdDateTime,parentReference&$top=200"
+
+# Video files (mp4, avi, mov, etc.); a tuple so str.endswith checks them all at once
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+
+# Conventional video names in a process folder, tried before listing it
+VIDEO_FILENAME_CANDIDATES = ('video.mp4', 'video.mov', 'video.webm')
+
+
+def _emit(*lines: str):
+    """Write several lines to stdout with a single write call"""
+    sys.stdout.write("\n".join(lines) + "\n")
+
+
+def _retry_after_seconds(value: Optional[str], default: float) -> float:
+    """
+    Parse a Retry-After header, given either as seconds or as an HTTP-date
+    Falls back to default when the header is missing or malformed
+    """
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
 class OneDriveManager:
     """Manages OneDrive operations for process videos"""
     
+    # Token shared by all instances in this process, guarded by _auth_lock
+    _auth_lock = threading.Lock()
+    _token: Optional[Dict[str, Any]] = None
+    _token_expires_at = 0.0
+    
+    # Seconds a find_process_video result is reused
+    VIDEO_URL_TTL = 300
+    
+    # Minimum seconds between token cache file writes
+    CACHE_WRITE_INTERVAL = 60
+    _cache_written_at = float('-inf')
+    
     def __init__(self):
         self.client_id = os.getenv('CLIENT_ID')
         self.tenant_id = os.getenv('TENANT_ID')
@@ -26,50 +90,133 @@ class OneDriveManager:
         self.token = None
         self.headers = None
         
-        self._authenticate()
-    
-    def _authenticate(self):
-        """Authenticate with Microsoft Graph API"""
-        cache = SerializableTokenCache()
-        if self.cache_file.exists():
-            cache.deserialize(self.cache_file.read_text())
-        
-        app = PublicClientApplication(
-            client_id=self.client_id,
-            authority=self.authority,
-            token_cache=cache
-        )
+        # Children listings: url (relative to /v1.0) -> (ETag, items), LRU-bounded;
+        # revalidated with If-None-Match so unchanged folders return an empty 304
+        self._listings: "OrderedDict[str, Tuple[str, List[Dict[str, Any]]]]" = OrderedDict()
+        self._listings_max = 4096
+        self._listings_lock = threading.Lock()
         
-        accounts = app.get_accounts()
-        token = None
+        # (api_key, process_uuid) -> (video URL or None, lookup time), LRU-bounded;
+        # expires after VIDEO_URL_TTL so newly uploaded videos are picked up
+        self._video_url_cache: "OrderedDict[Tuple[str, str], Tuple[Optional[str], float]]" = OrderedDict()
+        self._video_url_cache_max = 4096
         
-        if accounts:
-            print(f"   Using cached account: {accounts[0]['username']}")
-            token = app.acquire_token_silent(self.scopes, account=accounts[0])
+        # Folder path -> driveItem id, so Graph doesn't resolve the path on every call
+        self.folder_id_cache_file = Path.home() / ".onedrive_folder_ids.json"
+        self._folder_ids: Dict[str, str] = {}
+        self._folder_ids_changed = False
+        if self.folder_id_cache_file.exists():
+            try:
+                self._folder_ids = json.loads(self.folder_id_cache_file.read_text())
+            except ValueError:
+                print("   ⚠️  Ignoring unreadable folder id cache")
         
-        if not token:
-            print("   No cached token, initiating device flow...")
-            flow = app.initiate_device_flow(scopes=self.scopes)
-            if "user_code" not in flow:
-                raise RuntimeError("Failed to start device flow")
-            print("\n" + "=" * 60)
-            print(flow["message"])
-            print("=" * 60 + "\n")
-            token = app.acquire_token_by_device_flow(flow)
+        self._authenticate()
         
-        if "access_token" not in token:
-            raise RuntimeError(f"Auth failed: {token}")
+        # Wide $batch fan-outs from every lookup thread share these workers, so
+        # nested lookups never have more than ONEDRIVE_CONCURRENCY batches in flight
+        self.concurrency = int(os.getenv('ONEDRIVE_CONCURRENCY', '8'))
+        self._batch_executor = ThreadPoolExecutor(max_workers=self.concurrency)
         
-        if cache.has_state_changed:
-            self.cache_file.write_text(cache.serialize())
+        # One pooled session for every Graph call, shared by the lookup threads
+        # (the adapter's connection pool is thread-safe); sized for the lookup
+        # threads plus the batch workers, ONEDRIVE_CONCURRENCY of each
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.mount("https://", HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=max(50, 2 * self.concurrency),
+            # raise_on_status=False hands the final response to raise_for_status(),
+            # so exhausted retries surface as HTTPError rather than RetryError;
+            # 429 is left to _request, which honours Retry-After
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.3,
+                status_forcelist=[500, 502, 503, 504],
+                raise_on_status=False
+            )
+        ))
+    
+    def close(self):
+        """Save the token and folder id caches and close the batch workers and HTTP session"""
+        with OneDriveManager._auth_lock:
+            self._save_token_cache()
+        if self._folder_ids_changed:
+            self.folder_id_cache_file.write_text(json.dumps(self._folder_ids))
+            self._folder_ids_changed = False
+        self._batch_executor.shutdown()
+        self.session.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def _authenticate(self):
+        """
+        Authenticate with Microsoft Graph API
+        The token is shared by all instances and reused until shortly before it expires
+        """
+        cls = OneDriveManager
+        
+        with cls._auth_lock:
+            if cls._token is None or time.monotonic() >= cls._token_expires_at:
+                cls._token = self._acquire_token()
+                cls._token_expires_at = token_refresh_at(cls._token)
+                print("   ✅ OneDrive authentication successful")
+            else:
+                print("   ✅ Reusing OneDrive token")
+            
+            token = cls._token
         
         self.token = token
         self.headers = {
             "Authorization": f"Bearer {token['access_token']}",
             "Content-Type": "application/json"
         }
+    
+    def _acquire_token(self) -> Dict[str, Any]:
+        """Get a token from the shared MSAL app, silently if possible"""
+        app, _ = get_msal_app(self.client_id, self.authority, self.cache_file)
+        token = acquire_token(app, self.scopes)
+        
+        # Debounce cache file writes; close() flushes anything left pending
+        if time.monotonic() - OneDriveManager._cache_written_at >= self.CACHE_WRITE_INTERVAL:
+            self._save_token_cache()
         
-        print("   ✅ OneDrive authentication successful")
+        return token
+    
+    def _save_token_cache(self):
+        """Write the MSAL token cache to disk if it changed"""
+        _, cache = get_msal_app(self.client_id, self.authority, self.cache_file)
+        if save_token_cache(cache, self.cache_file):
+            OneDriveManager._cache_written_at = time.monotonic()
+    
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Send a Graph request, waiting out throttling (429 + Retry-After)
+        Raises HTTPError for error responses, including a 429 that outlasts the retries
+        """
+        attempts = 3
+        for attempt in range(attempts):
+            response = self.session.request(method, url, **kwargs)
+            if response.status_code != 429 or attempt == attempts - 1:
+                break
+            retry_after = _retry_after_seconds(response.headers.get("Retry-After"), 2 ** attempt)
+            print(f"   ⏳ Throttled by Graph, retrying in {retry_after:g}s")
+            time.sleep(retry_after)
+        
+        response.raise_for_status()
+        return response
+    
+    def _get_json(self, url: str) -> Dict[str, Any]:
+        """GET a Graph URL and return the decoded JSON body"""
+        return _json_loads(self._request("GET", url).content)
+    
+    def _post_json(self, url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """POST a JSON payload to a Graph URL and return the decoded JSON body"""
+        return _json_loads(self._request("POST", url, json=payload).content)
     
     def search_files_recursive(
         self, 
@@ -78,35 +225,37 @@ class OneDriveManager:
     ) -> List[Dict[str, Any]]:
         """
         Search for files recursively in a OneDrive folder
+        Uses Graph's server-side search, falling back to listing the whole subtree
         """
-        url = f"https://graph.microsoft.com/v1.0/me/drive/root:/{folder_path}:/children"
-        all_files = []
+        search_term = search_term.lower()
         
         try:
-            response = requests.get(url, headers=self.headers)
-            response.raise_for_status()
-            
-            items = response.json().get("value", [])
-            
-            for item in items:
-                # If it's a folder, search recursively
-                if "folder" in item:
-                    folder_name = item["name"]
-                    subfolder_path = f"{folder_path}/{folder_name}"
-                    all_files.extend(
-                        self.search_files_recursive(subfolder_path, search_term)
-                    )
-                
-                # If it's a file and matches search term
-                elif "file" in item:
-                    if search_term.lower() in item["name"].lower():
-                        all_files.append(item)
-            
-            return all_files
-            
-        except requests.exceptions.HTTPError as e:
-            print(f"   ⚠️  Error searching folder {folder_path}: {e}")
-            return []
+            items = self.search_files_server_side(search_term, folder_path)
+        except requests.exceptions.RequestException as e:
+            print(f"   ⚠️  Server-side search failed ({e}), listing {folder_path} instead")
+            items = self._list_files_recursive(f"{GRAPH_URL}/me/drive/root:/{quote(folder_path)}:/children{CHILDREN_QUERY}")
+        
+        # Graph search also matches content and metadata; keep name matches only
+        return [
+            item for item in items
+            if "file" in item and search_term in item["name"].lower()
+        ]
+    
+    def search_files_server_side(
+        self,
+        search_term: str,
+        folder_path: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Search files with Graph's search(q=...), within folder_path if given
+        One paged request instead of a listing per folder; note that newly
+        uploaded files can take a while to show up in the search index
+        """
+        scope = f"root:/{folder_path}:" if folder_path else "root"
+        query = quote(search_term.replace("'", "''"))
+        url = f"{GRAPH_URL}/me/drive/{scope}/search(q='{query}')"
+        
+        return self._follow_pages(self._get_json(url))
     
     def find_process_video(
         self, 
@@ -117,6 +266,32 @@ class OneDriveManager:
         Find video file for a specific process UUID
         Path structure: ONEDRIVE_ROOT/{api_key}/{process_uuid}/video.mp4
         Returns the OneDrive web URL if found
+        Results (including misses) are reused for VIDEO_URL_TTL seconds;
+        failed lookups are not
+        """
+        key = (api_key, process_uuid)
+        cached = self._video_url_cache.get(key)
+        if cached and time.monotonic() - cached[1] < self.VIDEO_URL_TTL:
+            return cached[0]
+        
+        try:
+            web_url = self._find_process_video(process_uuid, api_key)
+        except requests.exceptions.RequestException as e:
+            print(f"   ⚠️  Error accessing folder: {e}")
+            return None
+        
+        self._video_url_cache[key] = (web_url, time.monotonic())
+        self._video_url_cache.move_to_end(key)
+        if len(self._video_url_cache) > self._video_url_cache_max:
+            self._video_url_cache.popitem(last=False)
+        
+        return web_url
+    
+    def _find_process_video(self, process_uuid: str, api_key: str) -> Optional[str]:
+        """
+        Look up the video of a process in OneDrive (uncached find_process_video)
+        Returns None only when the process has no video; raises RequestException
+        when Graph errors keep the lookup from completing
         """
         print(f"   Searching OneDrive for: {process_uuid}")
         
@@ -125,35 +300,165 @@ class OneDriveManager:
         
         print(f"   Looking in: {process_folder}")
         
-        try:
-            # Get files directly in the process folder
-            url = f"https://graph.microsoft.com/v1.0/me/drive/root:/{process_folder}:/children"
-            
-            response = requests.get(url, headers=self.headers)
-            response.raise_for_status()
-            
-            items = response.json().get("value", [])
-            
-            # Find video files (mp4, avi, mov, etc.)
-            video_extensions = ['.mp4', '.avi', '.mov', '.mkv', '.webm']
-            
-            for item in items:
-                if "file" in item:
-                    file_name = item["name"].lower()
-                    if any(file_name.endswith(ext) for ext in video_extensions):
-                        web_url = item.get("webUrl")
-                        print(f"   ✅ Found: {item['name']}")
-                        return web_url
+        # Usually the video has a conventional name, found without listing the folder
+        video = self._probe_video_candidates(process_folder)
+        if video:
+            print(f"   ✅ Found: {video['name']}")
+            return video.get("webUrl")
+        
+        for attempt in range(2):
+            had_cached_id = process_folder in self._folder_ids
+            try:
+                # Get files directly in the process folder
+                folder_id = self._resolve_folder_id(process_folder)
+                url = f"{GRAPH_URL}/me/drive/items/{folder_id}/children{CHILDREN_QUERY}"
+                
+                items = self._get_listing(url)
+                break
             
-            print(f"   ⚠️  No video found in {process_folder}")
+            except requests.exceptions.RequestException as e:
+                if e.response is None or e.response.status_code != 404:
+                    raise
+                # The folder may have been moved or deleted since its id was cached
+                if self._folder_ids.pop(process_folder, None):
+                    self._folder_ids_changed = True
+                if had_cached_id and attempt == 0:
+                    # Resolve the path again before concluding the folder is gone
+                    continue
+                print(f"   ⚠️  Folder not found: {process_folder}")
+                return None
+        
+        video = self._find_video_item(items)
+        if video:
+            print(f"   ✅ Found: {video['name']}")
+            return video.get("webUrl")
+        
+        print(f"   ⚠️  No video found in {process_folder}")
+        return None
+    
+    def _probe_video_candidates(self, process_folder: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up VIDEO_FILENAME_CANDIDATES in a process folder by path
+        All candidates go in one $batch request; returns the first that exists
+        (in candidate order) or None
+        """
+        payload = {
+            "requests": [
+                {
+                    "id": str(i),
+                    "method": "GET",
+                    "url": f"/me/drive/root:/{quote(f'{process_folder}/{name}')}?$select=name,webUrl"
+                }
+                for i, name in enumerate(VIDEO_FILENAME_CANDIDATES)
+            ]
+        }
+        
+        try:
+            responses = self._post_json(f"{GRAPH_URL}/$batch", payload).get("responses", [])
+        except requests.exceptions.RequestException:
             return None
+        
+        found = {
+            int(result["id"]): result.get("body") or {}
+            for result in responses if result.get("status") == 200
+        }
+        return found[min(found)] if found else None
+    
+    def _resolve_folder_id(self, folder_path: str) -> str:
+        """
+        Return the driveItem id of a folder, resolving its path only once
+        Raises HTTPError (404 if the folder doesn't exist)
+        """
+        folder_id = self._folder_ids.get(folder_path)
+        if folder_id is None:
+            folder_id = self._get_json(f"{GRAPH_URL}/me/drive/root:/{folder_path}?$select=id")["id"]
+            self._folder_ids[folder_path] = folder_id
+            self._folder_ids_changed = True
+        return folder_id
+    
+    def find_process_videos_bulk(
+        self,
+        api_key: str,
+        process_uuids: Set[str]
+    ) -> Dict[str, Optional[str]]:
+        """
+        Find videos for several processes of the same client
+        Lists ONEDRIVE_ROOT/{api_key} once and matches process folders locally,
+        so processes without a folder cost no extra Graph calls
+        Returns dict mapping process_uuid to OneDrive web URL, or None when the
+        process is confirmed to have no video; processes that couldn't be
+        checked (Graph errors, throttling) are left out
+        """
+        client_folder = f"{self.onedrive_root}/{api_key}"
+        
+        # Clients are looked up concurrently, so collect this client's output
+        # and write it in one go instead of interleaving line by line
+        lines = [f"   Listing OneDrive folder: {client_folder}"]
+        
+        url = (
+            f"https://graph.microsoft.com/v1.0/me/drive/root:/{client_folder}:/children"
+            "?$select=id,name,folder,webUrl&$top=999"
+        )
+        
+        try:
+            folders = [item for item in self._get_listing(url) if "folder" in item]
+        
+        except requests.exceptions.RequestException as e:
+            if e.response is not None and e.response.status_code == 404:
+                lines.append(f"   ⚠️  Folder not found: {client_folder}")
+                _emit(*lines)
+                return dict.fromkeys(process_uuids)
+            lines.append(f"   ⚠️  Error accessing folder: {e}")
+            _emit(*lines)
+            return {}
+        
+        # Match process folders first, then fetch all their listings together
+        matched = []
+        remaining = set(process_uuids)
+        
+        for folder in folders:
+            if not remaining:
+                break
             
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 404:
-                print(f"   ⚠️  Folder not found: {process_folder}")
+            process_uuid = next((u for u in remaining if u in folder["name"]), None)
+            if process_uuid is None:
+                continue
+            remaining.discard(process_uuid)
+            matched.append((process_uuid, folder))
+        
+        listings = self._batch_children([
+            f"/me/drive/items/{folder['id']}/children{CHILDREN_QUERY}"
+            for _, folder in matched
+        ])
+        
+        video_links = {}
+        for (process_uuid, folder), items in zip(matched, listings):
+            if items is None:
+                lines.append(f"   ⚠️  Error accessing folder {folder['name']}")
+                continue
+            
+            video = self._find_video_item(items)
+            if video:
+                lines.append(f"   ✅ Found: {video['name']}")
+                video_links[process_uuid] = video.get("webUrl")
             else:
-                print(f"   ⚠️  Error accessing folder: {e}")
-            return None
+                lines.append(f"   ⚠️  No video found in {client_folder}/{folder['name']}")
+                video_links[process_uuid] = None
+        
+        for process_uuid in remaining:
+            lines.append(f"   ⚠️  Folder not found: {client_folder}/{process_uuid}")
+            video_links[process_uuid] = None
+        
+        _emit(*lines)
+        return video_links
+    
+    def _find_video_item(self, items: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Return the first video file in a children listing"""
+        for item in items:
+            if "file" in item and item["name"].lower().endswith(VIDEO_EXTENSIONS):
+                return item
+        
+        return None
     
     def create_sharing_link(self, item_id: str) -> Optional[str]:
         """
@@ -167,13 +472,10 @@ class OneDriveManager:
         }
         
         try:
-            response = requests.post(url, headers=self.headers, json=payload)
-            response.raise_for_status()
-            
-            link_data = response.json()
+            link_data = self._post_json(url, payload)
             return link_data.get("link", {}).get("webUrl")
             
-        except requests.exceptions.HTTPError as e:
+        except requests.exceptions.RequestException as e:
             print(f"   ⚠️  Error creating sharing link: {e}")
             return None
     
@@ -182,67 +484,193 @@ class OneDriveManager:
         Get all files uploaded to OneDrive in last 24 hours
         This is the original functionality from your script
         """
-        import datetime
-        from dateutil import tz
-        
-        now = datetime.datetime.now(tz=tz.UTC)
+        now = datetime.datetime.now(tz=datetime.timezone.utc)
         since = now - datetime.timedelta(hours=24)
         
-        url = f"https://graph.microsoft.com/v1.0/me/drive/root:/{self.onedrive_root}:/children"
+        # createdDateTime is ISO 8601 UTC, so comparing its seconds-precision
+        # prefix as text filters out old files without parsing them
+        since_prefix = since.strftime('%Y-%m-%dT%H:%M:%S')
         
-        try:
-            response = requests.get(url, headers=self.headers)
-            response.raise_for_status()
-            
-            all_files = self._list_files_recursive(url)
-            
-            # Filter by creation date
-            recent_files = []
-            for f in all_files:
-                if "file" not in f:
-                    continue
-                
-                created = datetime.datetime.fromisoformat(
-                    f["createdDateTime"].replace("Z", "+00:00")
-                )
-                
-                if created >= since:
-                    recent_files.append({
-                        "name": f["name"],
-                        "url": f["webUrl"],
-                        "created": created
-                    })
-            
-            return recent_files
+        # Percent-encoded here: the URL is sent inside a $batch body, not as a GET
+        url = f"{GRAPH_URL}/me/drive/root:/{quote(self.onedrive_root)}:/children{CHILDREN_QUERY}"
+        
+        # _list_files_recursive fetches the root itself and reports folders it can't read
+        all_files = self._list_files_recursive(url)
+        
+        # Filter by creation date
+        recent_files = []
+        for f in all_files:
+            if "file" not in f or f["createdDateTime"][:19] < since_prefix:
+                continue
             
-        except requests.exceptions.HTTPError as e:
-            print(f"   ❌ Error fetching OneDrive files: {e}")
-            return []
+            created = datetime.datetime.fromisoformat(
+                f["createdDateTime"].replace("Z", "+00:00")
+            )
+            recent_files.append({
+                "name": f["name"],
+                "url": f["webUrl"],
+                "created": created
+            })
+        
+        return recent_files
     
     def _list_files_recursive(self, url: str) -> List[Dict[str, Any]]:
-        """Helper to recursively list files"""
+        """
+        Helper to recursively list files
+        Walks the tree level by level, fetching each level's folders in $batch requests
+        """
         files = []
-        stack = [url]
+        level = [url[len(GRAPH_URL):] if url.startswith(GRAPH_URL) else url]
         
-        while stack:
-            current_url = stack.pop()
+        while level:
+            next_level = []
             
-            try:
-                resp = requests.get(current_url, headers=self.headers)
-                resp.raise_for_status()
-                
-                for item in resp.json().get("value", []):
+            for items in self._batch_children(level):
+                for item in items or []:
                     if "folder" in item:
-                        folder_url = f"https://graph.microsoft.com/v1.0/me/drive/items/{item['id']}/children"
-                        stack.append(folder_url)
+                        next_level.append(f"/me/drive/items/{item['id']}/children{CHILDREN_QUERY}")
                     elif "file" in item:
                         files.append(item)
             
-            except Exception as e:
-                print(f"   Warning: Error processing {current_url}: {e}")
-                continue
+            level = next_level
         
         return files
+    
+    def _batch_children(self, urls: List[str]) -> List[Optional[List[Dict[str, Any]]]]:
+        """
+        Fetch several children listings through Graph JSON batching
+        urls are relative to /v1.0 (e.g. /me/drive/items/{id}/children) and are
+        sent GRAPH_BATCH_LIMIT per request; throttled sub-requests are retried
+        Returns the items of each listing in order (None where it failed)
+        """
+        results: List[Optional[List[Dict[str, Any]]]] = [None] * len(urls)
+        pending = list(range(len(urls)))
+        
+        # Reported together at the end rather than one print per folder
+        warnings = []
+        
+        attempts = 3
+        for attempt in range(attempts):
+            throttled = []
+            retry_after = 0
+            
+            chunks = [
+                pending[start:start + GRAPH_BATCH_LIMIT]
+                for start in range(0, len(pending), GRAPH_BATCH_LIMIT)
+            ]
+            
+            # Wide levels span several batches; send those concurrently
+            # through the shared batch workers
+            if len(chunks) > 1:
+                batch_responses = list(self._batch_executor.map(lambda chunk: self._post_batch(urls, chunk), chunks))
+            else:
+                batch_responses = [self._post_batch(urls, chunk) for chunk in chunks]
+            
+            for responses in batch_responses:
+                for result in responses:
+                    i = int(result["id"])
+                    status = result.get("status", 500)
+                    body = result.get("body") or {}
+                    
+                    headers = result.get("headers") or {}
+                    
+                    if status == 304:
+                        cached = self._cached_listing(urls[i])
+                        results[i] = cached[1] if cached else None
+                    elif status == 429:
+                        throttled.append(i)
+                        retry_after = max(retry_after, _retry_after_seconds(headers.get("Retry-After"), 1))
+                    elif status >= 400:
+                        warnings.append(f"   Warning: Error processing {urls[i]}: {status} {body.get('error', {}).get('message', '')}")
+                    else:
+                        try:
+                            results[i] = self._follow_pages(body)
+                        except requests.exceptions.RequestException as e:
+                            warnings.append(f"   Warning: Error processing {urls[i]}: {e}")
+                            continue
+                        self._store_listing(urls[i], headers.get("ETag"), results[i])
+            
+            if not throttled:
+                break
+            
+            if attempt == attempts - 1:
+                # Out of attempts: these listings stay None, so say which ones
+                warnings.extend(f"   Warning: Gave up on {urls[i]}: still throttled" for i in throttled)
+                break
+            
+            print(f"   ⏳ Throttled on {len(throttled)} folder(s), retrying in {retry_after:g}s")
+            time.sleep(retry_after)
+            pending = throttled
+        
+        if warnings:
+            _emit(*warnings)
+        
+        return results
+    
+    def _post_batch(self, urls: List[str], chunk: List[int]) -> List[Dict[str, Any]]:
+        """
+        POST one $batch request for the listings urls[i] of chunk
+        Returns the sub-responses (empty if the batch call itself failed)
+        """
+        sub_requests = []
+        for i in chunk:
+            request = {"id": str(i), "method": "GET", "url": urls[i]}
+            cached = self._cached_listing(urls[i])
+            if cached:
+                request["headers"] = {"If-None-Match": cached[0]}
+            sub_requests.append(request)
+        payload = {"requests": sub_requests}
+        
+        try:
+            return self._post_json(f"{GRAPH_URL}/$batch", payload).get("responses", [])
+        except requests.exceptions.RequestException as e:
+            print(f"   Warning: Error processing batch of {len(chunk)} folder(s): {e}")
+            return []
+    
+    def _get_listing(self, url: str) -> List[Dict[str, Any]]:
+        """
+        GET a children listing with all its pages, revalidating a cached copy by ETag
+        Raises HTTPError
+        """
+        cached = self._cached_listing(url)
+        headers = {"If-None-Match": cached[0]} if cached else {}
+        
+        response = self._request("GET", url, headers=headers)
+        
+        # 304 Not Modified carries no body
+        if cached and response.status_code == 304:
+            return cached[1]
+        
+        items = self._follow_pages(_json_loads(response.content))
+        self._store_listing(url, response.headers.get("ETag"), items)
+        return items
+    
+    def _cached_listing(self, url: str) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+        """Return the cached (ETag, items) of a listing, if any"""
+        return self._listings.get(url[len(GRAPH_URL):] if url.startswith(GRAPH_URL) else url)
+    
+    def _store_listing(self, url: str, etag: Optional[str], items: List[Dict[str, Any]]):
+        """Cache a listing under its ETag, evicting the least recently stored ones"""
+        if not etag:
+            return
+        key = url[len(GRAPH_URL):] if url.startswith(GRAPH_URL) else url
+        with self._listings_lock:
+            self._listings[key] = (etag, items)
+            self._listings.move_to_end(key)
+            while len(self._listings) > self._listings_max:
+                self._listings.popitem(last=False)
+    
+    def _follow_pages(self, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Collect the items of a listing page and every page after it"""
+        items = list(data.get("value", []))
+        
+        next_url = data.get("@odata.nextLink")
+        while next_url:
+            data = self._get_json(next_url)
+            items.extend(data.get("value", []))
+            next_url = data.get("@odata.nextLink")
+        
+        return items
 
 
 if __name__ == "__main__":